@@ -3,6 +3,8 @@ import samsara
 import datetime
 from typing import List, Dict, Any
 
+import instrument
+
 
 def get_recent_issues(client: samsara.SamsaraClient, days: int = 7) -> List[Dict[str, Any]]:
     start_date = (datetime.datetime.now() - datetime.timedelta(days=days)).strftime("%Y-%m-%dT%H:%M:%SZ")
@@ -23,6 +25,7 @@ def assign_issue(client: samsara.SamsaraClient, issue_id: str, maintenance_manag
     })
 
 
+@instrument.handler
 def main(event, _):
     function = samsara.Function()
     secrets = function.secrets().load()
@@ -38,12 +41,15 @@ def main(event, _):
     maintenance_manager_id = event.get("maintenance_manager_id")
 
     # Get all open issues
-    issues = get_recent_issues(client)
+    with instrument.span("get_recent_issues") as attrs:
+        issues = get_recent_issues(client)
+        attrs["count"] = len(issues)
 
     # For each issue auto assign it to the maintenance manager
-    for issue in issues:
-        print(f"Assigning issue {issue.get('id')} to {maintenance_manager_id}")
-        assign_issue(client, issue.get("id"), maintenance_manager_id)
+    with instrument.span("assign_issues"):
+        for issue in issues:
+            print(f"Assigning issue {issue.get('id')} to {maintenance_manager_id}")
+            assign_issue(client, issue.get("id"), maintenance_manager_id)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,252 @@
+"""Microbenchmarks for the storage, slug bug and overtime report hot paths.
+
+Runs against LocalStorageClient in a temporary directory with in-process
+fakes for the Samsara endpoints, so no credentials or network are needed.
+Results are written as JSON so runs can be compared across commits:
+
+    python benchmarks/bench_hot_paths.py --output bench.json
+    python benchmarks/bench_hot_paths.py --compare bench.json
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import pathlib
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import db  # noqa: E402
+import slug_bug  # noqa: E402
+
+DB_SIZES = [1_000, 10_000, 100_000]
+SLUG_BUG_ROUNDS = 1_000
+SLUG_BUG_DONE_RATIOS = [0.0, 0.5, 0.9, 0.99]
+SLUG_BUG_HISTORY_DAYS = [0, 7, 30]
+FLEET_SIZES = [10, 100, 1_000]
+READINGS_PER_VEHICLE = 7 * 24
+
+
+class FakeResponse:
+    def __init__(self, payload: Dict[str, Any], status_code: int = 200):
+        self.payload = payload
+        self.status_code = status_code
+
+    def json(self) -> Dict[str, Any]:
+        return self.payload
+
+
+class FakeRequests:
+    """Stands in for the `requests` module used by slug_bug.
+
+    Media retrievals always report as pending, so repeated runs over the same
+    storage see the same state.
+    """
+
+    def get(self, url, **kwargs):
+        return FakeResponse({"data": {"media": [{"status": "pending"}]}})
+
+    def post(self, url, **kwargs):
+        return FakeResponse({"data": {"retrievalId": "fake", "status": "pending"}})
+
+
+def measure(fn: Callable[[], Any], repeat: int, ops: int = 1) -> Dict[str, Any]:
+    """Run fn `repeat` times and report timings per operation in microseconds."""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1e6 / ops)
+    return {
+        "repeat": repeat,
+        "ops": ops,
+        "min_us": round(min(samples), 3),
+        "median_us": round(statistics.median(samples), 3),
+        "mean_us": round(statistics.mean(samples), 3),
+    }
+
+
+def bench_db(sizes: List[int], repeat: int) -> List[Dict[str, Any]]:
+    results = []
+    value = {"status": "done", "media": [{"retrievalId": "r"}] * 3}
+    for size in sizes:
+        store = db.DB(name=f"bench_db_{size}")
+        keys = [f"key_{i}" for i in range(size)]
+
+        # Writing every key is the slowest part of the suite, so it only runs once.
+        results.append({"name": "db.set", "params": {"keys": size},
+                        **measure(lambda: [store.set(key, value) for key in keys], 1, size)})
+
+        sample = random.Random(size).sample(keys, min(size, 1_000))
+        results.append({"name": "db.get", "params": {"keys": size},
+                        **measure(lambda: [store.get(key) for key in sample], repeat, len(sample))})
+        results.append({"name": "db.list_keys", "params": {"keys": size},
+                        **measure(store.list_keys, repeat)})
+    return results
+
+
+def seed_slug_bug_rounds(rounds: int, done_ratio: float, history_days: int = 0):
+    """Seed rounds at the current time, plus `rounds` done rounds in each of
+    `history_days` day buckets older than the scan window."""
+    store = db.DB(name=slug_bug.db_name)
+    for key in store.list_keys():
+        store.delete(key)
+
+    now_ms = int(time.time() * 1000)
+    day_ms = 24 * 60 * 60 * 1000
+    done = int(rounds * done_ratio)
+    for i in range(rounds):
+        store_round(store, i, str(now_ms - i), "done" if i < done else "pending")
+
+    for day in range(slug_bug.SCAN_DAYS, slug_bug.SCAN_DAYS + history_days):
+        for i in range(rounds):
+            store_round(store, i, str(now_ms - day * day_ms - i), "done")
+
+
+def store_round(store: db.DB, asset_id: int, alert_time: str, status: str):
+    store.set(slug_bug.slug_bug_key(asset_id, alert_time), {
+        "media": [{"retrievalId": f"r{asset_id}_{alert_time}_{n}"} for n in range(3)],
+        "asset_id": str(asset_id),
+        "alert_time": alert_time,
+        "status": status,
+    })
+
+
+def bench_slug_bug(rounds: int, ratios: List[float], history: List[int], repeat: int) -> List[Dict[str, Any]]:
+    results = []
+    original_requests = slug_bug.requests
+    slug_bug.requests = FakeRequests()
+    try:
+        for ratio in ratios:
+            seed_slug_bug_rounds(rounds, ratio)
+            with contextlib.redirect_stdout(io.StringIO()):
+                timing = measure(slug_bug.get_available_slug_bug_rounds, repeat)
+            results.append({"name": "slug_bug.get_available_slug_bug_rounds",
+                            "params": {"rounds": rounds, "done_ratio": ratio}, **timing})
+
+        # Old buckets are outside the scan window, so this should stay flat as
+        # the history grows.
+        for days in history:
+            seed_slug_bug_rounds(rounds, 0.5, days)
+            with contextlib.redirect_stdout(io.StringIO()):
+                timing = measure(slug_bug.get_available_slug_bug_rounds, repeat)
+            results.append({"name": "slug_bug.get_available_slug_bug_rounds",
+                            "params": {"rounds": rounds, "done_ratio": 0.5, "history_days": days}, **timing})
+    finally:
+        slug_bug.requests = original_requests
+    return results
+
+
+def synthetic_fleet(vehicles: int, readings: int) -> List[Dict[str, Any]]:
+    rng = random.Random(vehicles)
+    start = datetime.datetime(2025, 6, 2, tzinfo=datetime.timezone.utc)
+    fleet = []
+    for v in range(vehicles):
+        odometer = rng.randint(1_000_000, 100_000_000)
+        entries = []
+        for r in range(readings):
+            odometer += rng.randint(0, 50_000)
+            at = start + datetime.timedelta(hours=r)
+            entries.append({"time": at.isoformat().replace("+00:00", "Z"), "value": odometer})
+        rng.shuffle(entries)
+        fleet.append({"id": str(v), "name": f"Truck {v}", "gpsOdometerMeters": entries})
+    return fleet
+
+
+def bench_overtime_report(sizes: List[int], repeat: int) -> List[Dict[str, Any]]:
+    import overtime_report
+
+    results = []
+    for size in sizes:
+        fleet = synthetic_fleet(size, READINGS_PER_VEHICLE)
+
+        def run():
+            for vehicle in overtime_report.filter_data(fleet):
+                overtime_report.calculate_total_miles(vehicle)
+
+        results.append({"name": "overtime_report.filter_data+calculate_total_miles",
+                        "params": {"vehicles": size, "readings": READINGS_PER_VEHICLE},
+                        **measure(run, repeat)})
+    return results
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=ROOT, text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def result_id(result: Dict[str, Any]) -> str:
+    params = ",".join(f"{k}={v}" for k, v in sorted(result["params"].items()))
+    return f"{result['name']}[{params}]"
+
+
+def compare(baseline_path: str, results: List[Dict[str, Any]]):
+    baseline = json.loads(pathlib.Path(baseline_path).read_text())
+    before = {result_id(r): r for r in baseline["results"]}
+    print(f"Compared to {baseline.get('commit') or baseline_path}:")
+    for result in results:
+        previous = before.get(result_id(result))
+        if previous is None:
+            continue
+        ratio = result["median_us"] / previous["median_us"] if previous["median_us"] else float("inf")
+        print(f"  {result_id(result)}: {previous['median_us']:.1f}us -> {result['median_us']:.1f}us ({ratio:.2f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db-sizes", type=int, nargs="+", default=DB_SIZES)
+    parser.add_argument("--rounds", type=int, default=SLUG_BUG_ROUNDS)
+    parser.add_argument("--done-ratios", type=float, nargs="+", default=SLUG_BUG_DONE_RATIOS)
+    parser.add_argument("--history-days", type=int, nargs="+", default=SLUG_BUG_HISTORY_DAYS)
+    parser.add_argument("--fleet-sizes", type=int, nargs="+", default=FLEET_SIZES)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="Write the JSON results to this file instead of stdout.")
+    parser.add_argument("--compare", help="Print the change against an earlier JSON results file.")
+    args = parser.parse_args()
+
+    # The fakes never check credentials, but the handlers read them eagerly.
+    os.environ.setdefault("SAMSARA_KEY", "bench")
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        # DB() uses LocalStorageClient, which stores files under ./storage.
+        os.chdir(tmp)
+        try:
+            results = bench_db(args.db_sizes, args.repeat)
+            results += bench_slug_bug(args.rounds, args.done_ratios, args.history_days, args.repeat)
+        finally:
+            os.chdir(cwd)
+    results += bench_overtime_report(args.fleet_sizes, args.repeat)
+
+    report = {
+        "commit": git_commit(),
+        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    if args.compare:
+        compare(args.compare, results)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        pathlib.Path(args.output).write_text(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,12 @@
 import boto3
+import datetime
 import os
 import json
 import pathlib
 from typing import Optional, Dict, Any, List
 
+import instrument
+
 
 class LocalStorageClient:
     """A local file system client that mimics the boto3 S3 client interface."""
@@ -42,21 +45,36 @@ class LocalStorageClient:
         file_path = self.base_dir / Key
         if file_path.exists():
             file_path.unlink()
+            # S3 has no empty "directories", so drop emptied parents like
+            # old day buckets instead of listing them forever.
+            for parent in file_path.parents:
+                if parent == self.base_dir or any(parent.iterdir()):
+                    break
+                parent.rmdir()
         return {"ResponseMetadata": {"HTTPStatusCode": 204}}
 
-    def list_objects_v2(self, Bucket: str, Prefix: str) -> Dict[str, List[Dict[str, str]]]:
-        """List objects in the local file system."""
+    def list_objects_v2(self, Bucket: str, Prefix: str, Delimiter: Optional[str] = None) -> Dict[str, List[Dict[str, str]]]:
+        """List objects in the local file system.
+
+        With a "/" delimiter only the direct children of the prefix are listed
+        and subdirectories are returned as CommonPrefixes, like S3.
+        """
         prefix_path = self.base_dir / Prefix
         if not prefix_path.exists():
             return {"Contents": []}
 
         contents = []
-        for file_path in prefix_path.rglob("*"):
+        common_prefixes = []
+        for file_path in (prefix_path.iterdir() if Delimiter else prefix_path.rglob("*")):
             if file_path.is_file():
                 contents.append({
                     "Key": str(file_path.relative_to(self.base_dir))
                 })
-        return {"Contents": contents}
+            elif Delimiter:
+                common_prefixes.append({
+                    "Prefix": str(file_path.relative_to(self.base_dir)) + Delimiter
+                })
+        return {"Contents": contents, "CommonPrefixes": common_prefixes}
 
     class exceptions:
         class NoSuchKey(Exception):
@@ -81,6 +99,16 @@ def get_storage_client():
         return LocalStorageClient()
 
 
+def day_bucket(at: datetime.datetime) -> str:
+    """Name of the UTC day bucket for a timestamp, e.g. "2025-06-02"."""
+    return at.astimezone(datetime.timezone.utc).strftime("%Y-%m-%d")
+
+
+def bucket_key(key: str, at: datetime.datetime) -> str:
+    """Place a key in the day bucket for the given time."""
+    return f"{day_bucket(at)}/{key}"
+
+
 class DB:
     def __init__(self, name: str = ""):
         self.storage = get_storage_client()
@@ -89,38 +117,93 @@ class DB:
 
     def set(self, key: str, value: dict) -> dict:
         """Store a JSON value at the given key. Returns the stored value."""
-        json_str = json.dumps(value, indent=2)
-        self.storage.put_object(
-            Bucket=self.bucket,
-            Key=f"{self.prefix}/{key}",
-            Body=json_str.encode('utf-8'),
-            ContentType='application/json'
-        )
+        body = json.dumps(value, indent=2).encode('utf-8')
+        with instrument.call("db", "set", key=key, bytes=len(body)):
+            self.storage.put_object(
+                Bucket=self.bucket,
+                Key=f"{self.prefix}/{key}",
+                Body=body,
+                ContentType='application/json'
+            )
         return value
 
     def get(self, key: str) -> Optional[dict]:
         """Retrieve a JSON value from the given key. Returns None if not found."""
-        try:
-            response = self.storage.get_object(Bucket=self.bucket, Key=f"{self.prefix}/{key}")
-            json_str = response['Body'].read().decode('utf-8')
-            return json.loads(json_str)
-        except (self.storage.exceptions.NoSuchKey, FileNotFoundError):
-            return None
+        with instrument.call("db", "get", key=key, bytes=0) as attrs:
+            try:
+                response = self.storage.get_object(Bucket=self.bucket, Key=f"{self.prefix}/{key}")
+                body = response['Body'].read()
+            except (self.storage.exceptions.NoSuchKey, FileNotFoundError):
+                attrs["found"] = False
+                return None
+            attrs["bytes"] = len(body)
+        return json.loads(body.decode('utf-8'))
 
     def delete(self, key: str) -> None:
         """Delete the value at the given key. Returns None."""
-        try:
-            self.storage.delete_object(Bucket=self.bucket, Key=f"{self.prefix}/{key}")
-        except (self.storage.exceptions.NoSuchKey, FileNotFoundError):
-            pass
+        with instrument.call("db", "delete", key=key):
+            try:
+                self.storage.delete_object(Bucket=self.bucket, Key=f"{self.prefix}/{key}")
+            except (self.storage.exceptions.NoSuchKey, FileNotFoundError):
+                pass
         return None
 
-    def list_keys(self) -> list[str]:
-        """List all keys in the store."""
-        response = self.storage.list_objects_v2(Bucket=self.bucket, Prefix=self.prefix)
-        return [item['Key'].replace(self.prefix + "/", "") for item in response.get('Contents', [])]
-
-
+    def _list_objects(self, prefix: str, delimiter: Optional[str] = None) -> list[dict]:
+        """Fetch every page of a listing under the store prefix."""
+        params = {"Bucket": self.bucket, "Prefix": f"{self.prefix}/{prefix}"}
+        if delimiter:
+            params["Delimiter"] = delimiter
+
+        pages = []
+        while True:
+            response = self.storage.list_objects_v2(**params)
+            pages.append(response)
+            if not response.get('IsTruncated'):
+                return pages
+            params["ContinuationToken"] = response['NextContinuationToken']
+
+    def list_keys(self, prefix: str = "") -> list[str]:
+        """List all keys in the store, optionally only those under a prefix."""
+        with instrument.call("db", "list_keys", prefix=prefix) as attrs:
+            keys = [
+                item['Key'].replace(self.prefix + "/", "", 1)
+                for page in self._list_objects(prefix)
+                for item in page.get('Contents', [])
+            ]
+            attrs["count"] = len(keys)
+        return keys
+
+    def list_buckets(self) -> list[str]:
+        """List the day buckets in the store, oldest first."""
+        with instrument.call("db", "list_buckets") as attrs:
+            buckets = []
+            for page in self._list_objects("", delimiter="/"):
+                for item in page.get('CommonPrefixes', []):
+                    name = item['Prefix'].replace(self.prefix + "/", "", 1).rstrip("/")
+                    try:
+                        datetime.date.fromisoformat(name)
+                    except ValueError:
+                        continue
+                    buckets.append(name)
+            attrs["count"] = len(buckets)
+        return sorted(buckets)
+
+    def list_keys_between(self, start: datetime.datetime, end: datetime.datetime) -> list[str]:
+        """List keys in the day buckets from start to end, inclusive.
+
+        Only the buckets in the window are listed, so the cost does not grow
+        with the age of the store.
+        """
+        keys = []
+        day = start.astimezone(datetime.timezone.utc).date()
+        last = end.astimezone(datetime.timezone.utc).date()
+        while day <= last:
+            keys.extend(self.list_keys(f"{day.isoformat()}/"))
+            day += datetime.timedelta(days=1)
+        return keys
+
+
+@instrument.handler
 def main(event, _):
     """Example usage of the DB class."""
     db = DB(name="demo")
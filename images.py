@@ -0,0 +1,91 @@
+import base64
+import datetime
+import io
+import os
+
+import requests
+from PIL import Image
+
+from db import DB, bucket_key
+import instrument
+
+db_name = "derived_images"
+
+# Frames are downscaled so their longest side is at most IMAGE_MAX_DIMENSION
+# pixels and re-encoded as JPEG at IMAGE_QUALITY before being sent to OpenAI.
+MAX_DIMENSION = int(os.getenv("IMAGE_MAX_DIMENSION", "1024"))
+QUALITY = int(os.getenv("IMAGE_QUALITY", "80"))
+
+
+def downscale(data: bytes, max_dimension: int = MAX_DIMENSION, quality: int = QUALITY) -> bytes:
+    """Resize an image to fit within max_dimension and re-encode it as JPEG."""
+    image = Image.open(io.BytesIO(data))
+    # Lets the JPEG decoder skip detail that would be thrown away by the resize.
+    image.draft("RGB", (max_dimension, max_dimension))
+    image = image.convert("RGB")
+    image.thumbnail((max_dimension, max_dimension))
+
+    out = io.BytesIO()
+    image.save(out, format="JPEG", quality=quality, optimize=True)
+    return out.getvalue()
+
+
+def frame_store(namespace: str) -> DB:
+    """The derived image cache for one caller, e.g. "derived_images/slug_bug".
+
+    Each caller gets its own store so its retention job only expires its own
+    frames.
+    """
+    return DB(name=f"{db_name}/{namespace}")
+
+
+def get_frame(namespace: str, frame_id: str, url: str, at: datetime.datetime,
+              max_dimension: int = MAX_DIMENSION, quality: int = QUALITY) -> bytes:
+    """Return the downscaled JPEG for a frame.
+
+    Derived images are cached by a stable frame ID and the settings, in the
+    day bucket for `at`, so retries never download or re-encode the same
+    frame twice. `expire_frames` removes old buckets.
+    """
+    db = frame_store(namespace)
+    key = bucket_key(f"{frame_id}_{max_dimension}_{quality}", at)
+
+    with instrument.span("get_frame", frame_id=frame_id) as attrs:
+        cached = db.get(key)
+        attrs["cached"] = cached is not None
+        if cached:
+            return base64.b64decode(cached['data'])
+
+        response = requests.get(url)
+        response.raise_for_status()
+        data = downscale(response.content, max_dimension, quality)
+        attrs["original_bytes"] = len(response.content)
+        attrs["bytes"] = len(data)
+
+        db.set(key, {
+            'frameId': frame_id,
+            'contentType': 'image/jpeg',
+            'maxDimension': max_dimension,
+            'quality': quality,
+            'data': base64.b64encode(data).decode('ascii')
+        })
+        return data
+
+
+def expire_frames(namespace: str, cutoff: str) -> int:
+    """Delete a caller's cached frames in day buckets before `cutoff`.
+    Returns the count."""
+    db = frame_store(namespace)
+    deleted = 0
+    for bucket in db.list_buckets():
+        if bucket >= cutoff:
+            break
+        for key in db.list_keys(f"{bucket}/"):
+            db.delete(key)
+            deleted += 1
+    return deleted
+
+
+def data_url(data: bytes) -> str:
+    """Inline a JPEG as a data URL for the OpenAI input_image content type."""
+    return f"data:image/jpeg;base64,{base64.b64encode(data).decode('ascii')}"
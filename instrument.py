@@ -0,0 +1,213 @@
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+# Set SAMSARA_FN_PROFILE=1 to run each handler under cProfile. The raw stats
+# are written to SAMSARA_FN_PROFILE_DIR (default /tmp) and the top entries are
+# printed to the function logs.
+PROFILE_ENV = "SAMSARA_FN_PROFILE"
+PROFILE_DIR_ENV = "SAMSARA_FN_PROFILE_DIR"
+PROFILE_TOP = 25
+
+# The summary line lists only the SAMSARA_FN_SLOWEST_CALLS slowest calls
+# (default 10) next to the per-kind totals. Set SAMSARA_FN_TRACE_CALLS=1 to
+# list every call instead.
+SLOWEST_CALLS_ENV = "SAMSARA_FN_SLOWEST_CALLS"
+TRACE_CALLS_ENV = "SAMSARA_FN_TRACE_CALLS"
+SLOWEST_CALLS = 10
+
+# The first invocation in a process is a cold start, every later one is warm.
+_cold_start = True
+_invocation: Optional["Invocation"] = None
+_http_patched = False
+
+
+class Invocation:
+    """Spans and external calls recorded during a single handler invocation."""
+
+    def __init__(self, handler: str, cold_start: bool):
+        self.handler = handler
+        self.cold_start = cold_start
+        self.started = time.perf_counter()
+        self.stages: List[Dict[str, Any]] = []
+        self.calls: List[Dict[str, Any]] = []
+
+    def summary(self, error: Optional[BaseException] = None) -> Dict[str, Any]:
+        """Build the JSON summary, aggregating calls by kind."""
+        totals: Dict[str, Dict[str, Any]] = {}
+        for call in self.calls:
+            total = totals.setdefault(call["kind"], {"count": 0, "ms": 0.0, "bytes": 0})
+            total["count"] += 1
+            total["ms"] = round(total["ms"] + call["ms"], 3)
+            total["bytes"] += call.get("bytes", 0)
+            if "error" in call:
+                total["errors"] = total.get("errors", 0) + 1
+
+        if _env_flag(TRACE_CALLS_ENV):
+            calls = self.calls
+        else:
+            limit = _int(os.environ.get(SLOWEST_CALLS_ENV), SLOWEST_CALLS)
+            calls = sorted(self.calls, key=lambda c: c["ms"], reverse=True)[:limit]
+
+        summary = {
+            "type": "invocation_summary",
+            "handler": self.handler,
+            "cold_start": self.cold_start,
+            "duration_ms": _elapsed_ms(self.started),
+            "stages": self.stages,
+            "totals": totals,
+            "calls": calls,
+        }
+        if error is not None:
+            summary["error"] = f"{type(error).__name__}: {error}"
+        return summary
+
+
+def _elapsed_ms(started: float) -> float:
+    return round((time.perf_counter() - started) * 1000, 3)
+
+
+def _env_flag(name: str) -> bool:
+    return os.environ.get(name, "").strip().lower() in ("1", "true", "yes", "on")
+
+
+def _int(value, default: int) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _body_size(body) -> Optional[int]:
+    """Size in bytes of a request body, or None for files and generators."""
+    if body is None:
+        return 0
+    if isinstance(body, str):
+        return len(body.encode('utf-8'))
+    if isinstance(body, (bytes, bytearray)):
+        return len(body)
+    return None
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """Time a stage of the current handler.
+
+    Yields a dict that callers can add attributes to. Outside of a handler
+    invocation this is a no-op.
+    """
+    started = time.perf_counter()
+    try:
+        yield attrs
+    finally:
+        if _invocation is not None:
+            _invocation.stages.append({"name": name, "ms": _elapsed_ms(started), **attrs})
+
+
+@contextmanager
+def call(kind: str, name: str, **attrs):
+    """Time an external call (storage or HTTP) made by the current handler.
+
+    Yields a dict that callers can add attributes to, e.g. "bytes" or
+    "status". A call that raises is recorded with the exception type under
+    "error". Outside of a handler invocation this is a no-op.
+    """
+    started = time.perf_counter()
+    try:
+        yield attrs
+    except BaseException as e:
+        attrs["error"] = type(e).__name__
+        raise
+    finally:
+        if _invocation is not None:
+            _invocation.calls.append({"kind": kind, "name": name, "ms": _elapsed_ms(started), **attrs})
+
+
+def _patch_requests():
+    """Record every request sent through the `requests` library."""
+    global _http_patched
+    if _http_patched:
+        return
+    try:
+        import requests
+    except ImportError:
+        return
+
+    send = requests.Session.send
+
+    @functools.wraps(send)
+    def instrumented_send(self, request, **kwargs):
+        # Files and generators are streamed by requests and have no size.
+        bytes_out = _body_size(request.body)
+        extra = {} if bytes_out is None else {"bytes_out": bytes_out}
+        url = request.url.split("?", 1)[0]
+        with call("http", f"{request.method} {url}", **extra) as attrs:
+            response = send(self, request, **kwargs)
+            attrs["status"] = response.status_code
+            # Streamed responses have not been read yet, so rely on the
+            # header rather than pulling the body into memory here.
+            if kwargs.get("stream"):
+                attrs["bytes"] = _int(response.headers.get("Content-Length"), 0)
+            else:
+                attrs["bytes"] = len(response.content)
+            return response
+
+    requests.Session.send = instrumented_send
+    _http_patched = True
+
+
+def _profile(handler_name: str, fn: Callable, *args, **kwargs):
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(fn, *args, **kwargs)
+    finally:
+        profile_dir = os.environ.get(PROFILE_DIR_ENV, "/tmp")
+        path = os.path.join(profile_dir, f"{handler_name}-{int(time.time() * 1000)}.prof")
+        profiler.dump_stats(path)
+
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(PROFILE_TOP)
+        print(f"cProfile stats written to {path}")
+        print(out.getvalue())
+
+
+def handler(fn: Callable) -> Callable:
+    """Instrument a Samsara Function entry point.
+
+    Prints one JSON summary line per invocation with the handler duration,
+    stage spans, storage and HTTP call timings and whether it was a cold start.
+    """
+    handler_name = f"{fn.__module__}.{fn.__name__}"
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        global _cold_start, _invocation
+        _patch_requests()
+
+        invocation = Invocation(handler_name, _cold_start)
+        _cold_start = False
+        outer, _invocation = _invocation, invocation
+        error = None
+        try:
+            if _env_flag(PROFILE_ENV):
+                return _profile(fn.__name__, fn, *args, **kwargs)
+            return fn(*args, **kwargs)
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            _invocation = outer
+            # Never let the instrumentation replace the handler's result or
+            # exception.
+            try:
+                print(json.dumps(invocation.summary(error), default=str))
+            except Exception as e:
+                print(f"Failed to write invocation summary: {type(e).__name__}: {e}")
+
+    return wrapper
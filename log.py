@@ -1,3 +1,7 @@
+import instrument
+
+
+@instrument.handler
 def handler(event, _):
     print("test")
     print(event)
@@ -8,6 +8,8 @@ from samsara import Samsara
 # from tabulate import tabulate
 from collections import defaultdict
 
+import instrument
+
 
 def get_vehicle_stats_history(start_at_str, end_at_str, types):
     # url = f"https://api.samsara.com/fleet/vehicles/stats/history"
@@ -124,6 +126,7 @@ def create_summary_table(filtered_data, start_time, end_time, csv_file_path="veh
     print(f"Data exported to {csv_file_path}")
 
 
+@instrument.handler
 def main():
     end_at = datetime.datetime.now(datetime.timezone.utc)
     start_at = end_at - datetime.timedelta(days=7)
@@ -132,7 +135,8 @@ def main():
 
     types = "gpsOdometerMeters"
     try:
-        stats_history = get_vehicle_stats_history(start_at_str, end_at_str, types)
+        with instrument.span("get_vehicle_stats_history"):
+            stats_history = get_vehicle_stats_history(start_at_str, end_at_str, types)
         # filtered_data = filter_data(stats_history)
         # create_summary_table(filtered_data, start_at, end_at)
     except requests.exceptions.HTTPError as e:
@@ -9,7 +9,15 @@ import base64
 import os
 import json
 
+from db import day_bucket
+import images
+import instrument
+
 base_url = 'https://api.samsara.com'
+frames_namespace = 'paint_suggestions'
+
+# Cached frames older than this are deleted by `expire`.
+RETENTION_DAYS = int(os.getenv("PAINT_SUGGESTIONS_RETENTION_DAYS", "7"))
 
 
 def timestamp_to_datetime(timestamp_ms):
@@ -44,40 +52,42 @@ def get_media_retrieval(media_retrieval_id):
   return response.json()
 
 
+@instrument.handler
 def main(event, _):
   # # Convert milliseconds timestamp to RFC 3339 format
   alert_at = event['alertIncidentTime']
   capture_at = timestamp_to_datetime(int(alert_at)) + datetime.timedelta(seconds=11)
   asset_id = event['assetId']
 
-  media_retrieval_response = create_media_retreival(capture_at, asset_id)
-  media_retrieval_id = media_retrieval_response['data']['retrievalId']
-  media_retrieval_response = get_media_retrieval(media_retrieval_id)
+  with instrument.span("media_retrieval"):
+    media_retrieval_response = create_media_retreival(capture_at, asset_id)
+    media_retrieval_id = media_retrieval_response['data']['retrievalId']
+    media_retrieval_response = get_media_retrieval(media_retrieval_id)
 
   # Download the image
   if media_retrieval_response['data']['media'][0]['status'] == 'available':
     image_url = media_retrieval_response['data']['media'][0]['urlInfo']['url']
 
-    # Download the image
-    response = requests.get(image_url)
-    with open(f'image-{alert_at}.jpg', 'wb') as f:
-      f.write(response.content)
+    # Download a downscaled copy of the image. A new retrieval is created on
+    # every run, so cache the frame by asset and capture time instead.
+    image = images.get_frame(frames_namespace, f"{asset_id}_{capture_at.isoformat()}", image_url, capture_at)
 
     print("Generating a paint suggestion...")
 
     # Make the API request to OpenAI for image editing
-    openai_response = requests.post(
-      "https://api.openai.com/v1/images/edits",
-      headers={
-        "Authorization": f"Bearer {os.environ['OPENAI_API_KEY']}"
-      },
-      files={
-        "image[]": ("image.jpg", open("image.jpg", "rb"), "image/jpeg"),
-        "model": (None, "gpt-image-1"),
-        "prompt": (None, "Generate an image of this building with a new paint job with a modern popular color to send the home owner inspiration and a quote to paint the exterior of their home. Remove the surrounding vehicle details captured from the dashcam.")
-      },
-      verify=False  # Disable SSL certificate verification
-    )
+    with instrument.span("generate_paint_suggestion"):
+      openai_response = requests.post(
+        "https://api.openai.com/v1/images/edits",
+        headers={
+          "Authorization": f"Bearer {os.environ['OPENAI_API_KEY']}"
+        },
+        files={
+          "image[]": ("image.jpg", image, "image/jpeg"),
+          "model": (None, "gpt-image-1"),
+          "prompt": (None, "Generate an image of this building with a new paint job with a modern popular color to send the home owner inspiration and a quote to paint the exterior of their home. Remove the surrounding vehicle details captured from the dashcam.")
+        },
+        verify=False  # Disable SSL certificate verification
+      )
 
     # Parse the response and save the image
     if openai_response.status_code == 200:
@@ -96,17 +106,18 @@ def main(event, _):
       print(openai_response.text)
 
     # Get the vehicle location from the Samsara API
-    location_response = requests.get(
-      f'{base_url}/fleet/vehicles/locations',
-      headers={
-        'Authorization': f'Bearer {os.environ["SAMSARA_KEY"]}',
-        'accept': 'application/json'
-      },
-      params={
-        'time': capture_at.isoformat(),
-        'vehicleIds': asset_id
-      }
-    )
+    with instrument.span("vehicle_location"):
+      location_response = requests.get(
+        f'{base_url}/fleet/vehicles/locations',
+        headers={
+          'Authorization': f'Bearer {os.environ["SAMSARA_KEY"]}',
+          'accept': 'application/json'
+        },
+        params={
+          'time': capture_at.isoformat(),
+          'vehicleIds': asset_id
+        }
+      )
 
     if location_response.status_code == 200:
       location_data = location_response.json()
@@ -120,6 +131,17 @@ def main(event, _):
     print("No media found")
 
 
+
+# Retention job: on a daily timer, delete cached frames older than the
+# retention period.
+@instrument.handler
+def expire(event, _):
+  retention_days = int((event or {}).get('retention_days', RETENTION_DAYS))
+  cutoff = day_bucket(datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=retention_days))
+  deleted = images.expire_frames(frames_namespace, cutoff)
+  print(f"Deleted {deleted} cached frames")
+
+
 if __name__ == "__main__":
     event = {
       'SamsaraFunctionTriggerSource': 'alert',
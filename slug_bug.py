@@ -4,10 +4,20 @@ import base64
 import os
 import json
 
-from db import DB
+from db import DB, bucket_key, day_bucket
+import images
+import instrument
 
 base_url = 'https://api.samsara.com'
 db_name = "slug_bug"
+archive_db_name = "slug_bug_archive"
+
+# Rounds and media retrievals are stored in day buckets. `check` only scans
+# the most recent buckets, and `compact` archives finished rounds once they
+# are older than the retention period.
+# At least today's bucket is always scanned.
+SCAN_DAYS = max(int(os.getenv("SLUG_BUG_SCAN_DAYS", "2")), 1)
+RETENTION_DAYS = int(os.getenv("SLUG_BUG_RETENTION_DAYS", "7"))
 
 
 def timestamp_to_datetime(timestamp_ms):
@@ -15,12 +25,24 @@ def timestamp_to_datetime(timestamp_ms):
   return datetime.datetime.fromtimestamp(timestamp_ms / 1000, tz=datetime.timezone.utc)
 
 
+def slug_bug_key(asset_id, alert_time):
+  """Key for a slug bug round, bucketed by the day of the alert."""
+  return bucket_key(f'slug_bug_{asset_id}_{alert_time}', timestamp_to_datetime(int(alert_time)))
+
+
+def media_retrieval_key(asset_id, capture_at):
+  """Key for a media retrieval, bucketed by the day of the capture."""
+  return bucket_key(f'media_retrieval_{asset_id}_{capture_at.isoformat()}', capture_at)
+
+
 def create_media_retreival(alert_at, asset_id):
   # If we've already created a media retrieval for this asset and alert time, return the existing one.
   db = DB(name=db_name)
-  if db.get(f'media_retrieval_{asset_id}_{alert_at.isoformat()}'):
+  key = media_retrieval_key(asset_id, alert_at)
+  existing = db.get(key)
+  if existing:
     print(f"Media retrieval already exists for {asset_id} at {alert_at.isoformat()}")
-    return db.get(f'media_retrieval_{asset_id}_{alert_at.isoformat()}')
+    return existing
 
   # Otherwise, create a new media retrieval request.
   response = requests.post(
@@ -37,7 +59,7 @@ def create_media_retreival(alert_at, asset_id):
     }
   )
   retrieval = response.json()['data']
-  db.set(f'media_retrieval_{asset_id}_{alert_at.isoformat()}', retrieval)
+  db.set(key, retrieval)
   return retrieval
 
 
@@ -54,13 +76,15 @@ def get_media_retrieval(media_retrieval_id):
 def get_available_slug_bug_rounds():
   """ Check to see if all media retrievals are ready.
 
-  If all are available, add it to the list and return.
+  If all are available, add it to the list and return. Only rounds from the
+  last SCAN_DAYS day buckets are checked.
   """
   db = DB(name=db_name)
-  keys = db.list_keys()
+  now = datetime.datetime.now(datetime.timezone.utc)
+  keys = db.list_keys_between(now - datetime.timedelta(days=SCAN_DAYS - 1), now)
   slug_bug_keys = []
   for key in keys:
-    if key.startswith('slug_bug_'):
+    if key.split('/')[-1].startswith('slug_bug_'):
       slug_bug_keys.append(key)
 
   slug_bug_rounds = []
@@ -83,9 +107,17 @@ def identify_slug_bugs(slug_bug):
     "text": "Identify slug bugs in the images."
   }]
   for media_item in slug_bug['media']:
+    # Send a downscaled copy inline instead of the full-size frame URL. It is
+    # cached in the round's day bucket so `compact` removes both together.
+    frame = images.get_frame(
+      db_name,
+      media_item['retrievalId'],
+      media_item['urlInfo']['url'],
+      timestamp_to_datetime(int(slug_bug['alert_time']))
+    )
     user_content.append({
       "type": "input_image",
-      "image_url": media_item['urlInfo']['url']
+      "image_url": images.data_url(frame)
     })
 
   # Make the API request to OpenAI for image editing
@@ -152,7 +184,7 @@ def notify_players(color):
 def mark_slug_bug_round_as_done(slug_bug_round):
   print(f"Marking slug bug round as done: {slug_bug_round}")
   db = DB(name=db_name)
-  key = f"slug_bug_{slug_bug_round['asset_id']}_{slug_bug_round['alert_time']}"
+  key = slug_bug_key(slug_bug_round['asset_id'], slug_bug_round['alert_time'])
   db.set(key, {
     **slug_bug_round,
     'status': 'done'
@@ -179,6 +211,7 @@ def check_media_retrieval_status(slug_bug):
 
 # Entry point for part 1: On Driver Recorded event, create retrieval requests
 # for images around the time the button was clicked.
+@instrument.handler
 def start(event, _):
   db = DB(name=db_name)
 
@@ -188,7 +221,8 @@ def start(event, _):
   alert_at = timestamp_to_datetime(int(alert_time))
   asset_id = event['assetId']
 
-  if db.get(f'slug_bug_{asset_id}_{alert_time}'):
+  key = slug_bug_key(asset_id, alert_time)
+  if db.get(key):
     print(f"Slug bug checker already exists for {asset_id} at {alert_time}")
     return
 
@@ -196,13 +230,14 @@ def start(event, _):
   # after, and 3 seconds after clicking the button.
   offsets = [14, 11, 7]
   media = []
-  for offset in offsets:
-    capture_at = alert_at + datetime.timedelta(seconds=offset)
-    media_retrieval = create_media_retreival(capture_at, asset_id)
-    media.append(media_retrieval)
+  with instrument.span("create_media_retrievals", count=len(offsets)):
+    for offset in offsets:
+      capture_at = alert_at + datetime.timedelta(seconds=offset)
+      media_retrieval = create_media_retreival(capture_at, asset_id)
+      media.append(media_retrieval)
 
   # Write to db and wait for the media retrieval to be available.
-  db.set(f'slug_bug_{asset_id}_{alert_time}', {
+  db.set(key, {
     'media': media,
     'alert_at': alert_at.isoformat(),
     'asset_id': asset_id,
@@ -213,22 +248,119 @@ def start(event, _):
 
 # Entry point for part 2: On a timer, check the status of the media retrievals
 # and identify slug bugs in the images if they are available.
+@instrument.handler
 def check(event, _):
-  slug_bug_rounds = get_available_slug_bug_rounds()
+  with instrument.span("get_available_slug_bug_rounds") as attrs:
+    slug_bug_rounds = get_available_slug_bug_rounds()
+    attrs["count"] = len(slug_bug_rounds)
   if len(slug_bug_rounds) == 0:
     print("No media is available, yet.")
     return
 
   for slug_bug_round in slug_bug_rounds:
-    color, found = identify_slug_bugs(slug_bug_round)
+    with instrument.span("identify_slug_bugs", asset_id=slug_bug_round['asset_id']):
+      color, found = identify_slug_bugs(slug_bug_round)
     if found:
       print(f"Slug Bug {color}! 🤜")
-      notify_players(color)
+      with instrument.span("notify_players"):
+        notify_players(color)
     else:
       print("No slug bug found.")
     mark_slug_bug_round_as_done(slug_bug_round)
 
 
+# Retention job: on a daily timer, move rounds older than the retention period
+# into one archive object per day and delete the originals along with their
+# cached frames. Rounds that never finished are archived with status "expired".
+@instrument.handler
+def compact(event, _):
+  retention_days = int((event or {}).get('retention_days', RETENTION_DAYS))
+  cutoff = day_bucket(datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=retention_days))
+  db = DB(name=db_name)
+  archive_db = DB(name=archive_db_name)
+
+  for bucket in db.list_buckets():
+    if bucket >= cutoff:
+      break
+
+    with instrument.span("compact_bucket", bucket=bucket) as attrs:
+      round_keys = []
+      rounds = []
+      stale_keys = []
+      for key in db.list_keys(f"{bucket}/"):
+        name = key.split('/')[-1]
+        if name.startswith('slug_bug_'):
+          slug_bug = db.get(key)
+          round_keys.append(key)
+          if slug_bug is None:
+            continue
+          if slug_bug['status'] != 'done':
+            slug_bug = {**slug_bug, 'status': 'expired'}
+          rounds.append(slug_bug)
+        elif name.startswith('media_retrieval_'):
+          # Only used to de-duplicate retrievals while a round is started.
+          stale_keys.append(key)
+
+      if rounds:
+        # A previous run may have written the archive and failed before
+        # deleting the originals, so skip rounds that are already archived.
+        archive = archive_db.get(bucket) or {'day': bucket, 'rounds': []}
+        archived = {(r['asset_id'], r['alert_time']) for r in archive['rounds']}
+        new_rounds = [r for r in rounds if (r['asset_id'], r['alert_time']) not in archived]
+        if new_rounds:
+          archive['rounds'].extend(new_rounds)
+          archive_db.set(bucket, archive)
+
+      # Delete only after the archive has been written.
+      for key in round_keys + stale_keys:
+        db.delete(key)
+
+      expired = sum(1 for r in rounds if r['status'] == 'expired')
+      attrs["archived"] = len(rounds)
+      attrs["expired"] = expired
+      attrs["deleted"] = len(round_keys) + len(stale_keys)
+      print(f"Archived {len(rounds)} slug bug rounds ({expired} expired) from {bucket}")
+
+  with instrument.span("expire_frames") as attrs:
+    attrs["deleted"] = images.expire_frames(db_name, cutoff)
+
+
+def migrated_key(key):
+  """Bucketed key for a key from the old flat layout, or None if unknown or
+  malformed."""
+  try:
+    if key.startswith('slug_bug_'):
+      asset_id, alert_time = key[len('slug_bug_'):].rsplit('_', 1)
+      return slug_bug_key(asset_id, alert_time)
+    if key.startswith('media_retrieval_'):
+      asset_id, capture_at = key[len('media_retrieval_'):].rsplit('_', 1)
+      return media_retrieval_key(asset_id, datetime.datetime.fromisoformat(capture_at))
+  except ValueError:
+    return None
+  return None
+
+
+# One-off migration: move keys from the old flat layout into day buckets.
+@instrument.handler
+def migrate(event, _):
+  db = DB(name=db_name)
+  moved = 0
+  for key in db.list_keys():
+    if '/' in key:
+      continue
+
+    new_key = migrated_key(key)
+    if new_key is None:
+      print(f"Skipping unrecognized key {key}")
+      continue
+
+    db.set(new_key, db.get(key))
+    db.delete(key)
+    moved += 1
+
+  print(f"Migrated {moved} keys")
+
+
 
 if __name__ == "__main__":
     event = {